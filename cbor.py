@@ -17,6 +17,11 @@ Supported types:
 - dict (with keys/values from supported types)
 
 Decoding supports both definite and indefinite length strings/arrays/maps.
+
+When the input is read-only (e.g. `bytes`), definite-length byte strings
+decode to `memoryview` slices of it rather than `bytes` copies; callers that
+need `bytes` can take `bytes(view)`. Input that can be mutated (e.g. a
+`bytearray`) still gets copies, and map keys are always `bytes`.
 """
 
 from __future__ import annotations
@@ -39,6 +44,13 @@ class CBOREncodeError(CBORError):
 
 _BREAK = object()
 
+_S_H = struct.Struct("!H")
+_S_I = struct.Struct("!I")
+_S_Q = struct.Struct("!Q")
+_S_d = struct.Struct("!d")
+_S_f = struct.Struct("!f")
+_S_e = struct.Struct("!e")
+
 
 def dumps(obj: Any) -> bytes:
     out = bytearray()
@@ -53,10 +65,12 @@ def dump(obj: Any, fp) -> None:
 def loads(data: bytes | bytearray | memoryview) -> Any:
     if not isinstance(data, (bytes, bytearray, memoryview)):
         raise TypeError("cbor.loads expects a bytes-like object")
-    raw = bytes(data)
-    value, idx = _decode(raw, 0)
-    if idx != len(raw):
-        raise CBORDecodeError(f"Trailing bytes after CBOR object: {len(raw) - idx}")
+    # Decode over a flat byte view so the input is never copied as a whole;
+    # for read-only input byte strings come back as slices of it.
+    mv = memoryview(data).cast("B")
+    value, idx = _decode(mv, 0)
+    if idx != len(mv):
+        raise CBORDecodeError(f"Trailing bytes after CBOR object: {len(mv) - idx}")
     return value
 
 
@@ -75,40 +89,59 @@ def _encode(obj: Any, out: bytearray) -> None:
         out.append(0xF5)
         return
 
-    if isinstance(obj, int) and not isinstance(obj, bool):
+    # Headers with a length/value below 24 fit in the initial byte; write
+    # those inline rather than going through _write_type_and_len.
+    if isinstance(obj, int):
         if obj >= 0:
-            out.extend(_encode_type_and_len(0, obj))
+            if obj < 24:
+                out.append(obj)
+            else:
+                _write_type_and_len(0, obj, out)
+            return
+        n = -1 - obj
+        if n < 24:
+            out.append(0x20 | n)
         else:
-            out.extend(_encode_type_and_len(1, -1 - obj))
+            _write_type_and_len(1, n, out)
         return
 
     if isinstance(obj, float):
         # Encode as float64.
         out.append(0xFB)
-        out.extend(struct.pack("!d", obj))
-        return
-
-    if isinstance(obj, (bytes, bytearray, memoryview)):
-        b = bytes(obj)
-        out.extend(_encode_type_and_len(2, len(b)))
-        out.extend(b)
+        out += _S_d.pack(obj)
         return
 
-    if isinstance(obj, str):
-        b = obj.encode("utf-8")
-        out.extend(_encode_type_and_len(3, len(b)))
-        out.extend(b)
+    if isinstance(obj, (bytes, bytearray, memoryview, str)):
+        if isinstance(obj, str):
+            major = 3
+            b = obj.encode("utf-8")
+        else:
+            major = 2
+            b = obj if type(obj) is bytes else bytes(obj)
+        n = len(b)
+        if n < 24:
+            out.append((major << 5) | n)
+        else:
+            _write_type_and_len(major, n, out)
+        out += b
         return
 
     if isinstance(obj, (list, tuple, set, frozenset)):
-        items = list(obj)
-        out.extend(_encode_type_and_len(4, len(items)))
-        for item in items:
+        n = len(obj)
+        if n < 24:
+            out.append(0x80 | n)
+        else:
+            _write_type_and_len(4, n, out)
+        for item in obj:
             _encode(item, out)
         return
 
     if isinstance(obj, dict):
-        out.extend(_encode_type_and_len(5, len(obj)))
+        n = len(obj)
+        if n < 24:
+            out.append(0xA0 | n)
+        else:
+            _write_type_and_len(5, n, out)
         for k, v in obj.items():
             _encode(k, out)
             _encode(v, out)
@@ -117,190 +150,213 @@ def _encode(obj: Any, out: bytearray) -> None:
     raise CBOREncodeError(f"Unsupported type for CBOR encoding: {type(obj)!r}")
 
 
-def _encode_type_and_len(major: int, length: int) -> bytes:
+def _write_type_and_len(major: int, length: int, out: bytearray) -> None:
     if length < 0:
         raise CBOREncodeError("Negative length is invalid")
     if length < 24:
-        return bytes([(major << 5) | length])
-    if length < 256:
-        return bytes([(major << 5) | 24, length])
-    if length < 65536:
-        return bytes([(major << 5) | 25]) + struct.pack("!H", length)
-    if length < 2**32:
-        return bytes([(major << 5) | 26]) + struct.pack("!I", length)
-    if length < 2**64:
-        return bytes([(major << 5) | 27]) + struct.pack("!Q", length)
-    raise CBOREncodeError("Length too large")
-
-
-def _read_n(data: bytes, idx: int, n: int) -> Tuple[bytes, int]:
+        out.append((major << 5) | length)
+    elif length < 256:
+        out.append((major << 5) | 24)
+        out.append(length)
+    elif length < 65536:
+        out.append((major << 5) | 25)
+        out += _S_H.pack(length)
+    elif length < 2**32:
+        out.append((major << 5) | 26)
+        out += _S_I.pack(length)
+    elif length < 2**64:
+        out.append((major << 5) | 27)
+        out += _S_Q.pack(length)
+    else:
+        raise CBOREncodeError("Length too large")
+
+
+def _read_n(data: memoryview, idx: int, n: int) -> Tuple[memoryview, int]:
     end = idx + n
     if end > len(data):
         raise CBORDecodeError("Unexpected end of data")
     return data[idx:end], end
 
 
-def _read_uint(data: bytes, idx: int, addl: int) -> Tuple[int | None, int]:
+def _unpack(st: struct.Struct, data: memoryview, idx: int) -> Tuple[Any, int]:
+    end = idx + st.size
+    if end > len(data):
+        raise CBORDecodeError("Unexpected end of data")
+    return st.unpack_from(data, idx)[0], end
+
+
+def _read_uint(data: memoryview, idx: int, addl: int) -> Tuple[int | None, int]:
     if addl < 24:
         return addl, idx
     if addl == 24:
-        b, idx = _read_n(data, idx, 1)
-        return b[0], idx
+        if idx >= len(data):
+            raise CBORDecodeError("Unexpected end of data")
+        return data[idx], idx + 1
     if addl == 25:
-        b, idx = _read_n(data, idx, 2)
-        return struct.unpack("!H", b)[0], idx
+        return _unpack(_S_H, data, idx)
     if addl == 26:
-        b, idx = _read_n(data, idx, 4)
-        return struct.unpack("!I", b)[0], idx
+        return _unpack(_S_I, data, idx)
     if addl == 27:
-        b, idx = _read_n(data, idx, 8)
-        return struct.unpack("!Q", b)[0], idx
+        return _unpack(_S_Q, data, idx)
     if addl == 31:
         return None, idx  # Indefinite length.
     raise CBORDecodeError(f"Invalid additional info: {addl}")
 
 
-def _decode(data: bytes, idx: int) -> Tuple[Any, int]:
-    if idx >= len(data):
-        raise CBORDecodeError("Unexpected end of data")
-    initial = data[idx]
-    idx += 1
-    major = initial >> 5
-    addl = initial & 0x1F
-
-    if major in (0, 1, 2, 3, 4, 5, 6):
-        length, idx = _read_uint(data, idx, addl)
-
-    if major == 0:
-        assert length is not None
-        return int(length), idx
-
-    if major == 1:
-        assert length is not None
-        return -1 - int(length), idx
-
-    if major == 2:
-        if length is None:
-            chunks = []
-            while True:
-                chunk, idx = _decode(data, idx)
-                if chunk is _BREAK:
+# Container frames on the _decode work stack: [kind, remaining, container, key].
+# `remaining` is None for indefinite-length containers.
+_ARRAY, _MAP, _BYTES_CHUNKS, _TEXT_CHUNKS = range(4)
+_NO_KEY = object()
+
+
+def _decode(data: memoryview, idx: int) -> Tuple[Any, int]:
+    # Iterative rather than recursive: nested arrays/maps push a frame instead
+    # of a Python call, so deep payloads cost no interpreter frames and cannot
+    # hit the recursion limit.
+    stack: list = []
+    end = len(data)
+    # Views into a writable buffer would change under the caller (and are
+    # unhashable), so those byte strings are copied.
+    copy_bytes = not data.readonly
+    while True:
+        if idx >= end:
+            raise CBORDecodeError("Unexpected end of data")
+        initial = data[idx]
+        idx += 1
+        major = initial >> 5
+        addl = initial & 0x1F
+
+        if major == 7:
+            value, idx = _decode_simple(data, idx, addl)
+        else:
+            length, idx = _read_uint(data, idx, addl)
+            if major == 0:
+                if length is None:
+                    raise CBORDecodeError(f"Invalid additional info: {addl}")
+                value = length
+            elif major == 1:
+                if length is None:
+                    raise CBORDecodeError(f"Invalid additional info: {addl}")
+                value = -1 - length
+            elif major == 2:
+                if length is None:
+                    stack.append([_BYTES_CHUNKS, None, [], None])
+                    continue
+                # A view into the input, not a copy (see the module docstring).
+                value, idx = _read_n(data, idx, length)
+                if copy_bytes:
+                    value = bytes(value)
+            elif major == 3:
+                if length is None:
+                    stack.append([_TEXT_CHUNKS, None, [], None])
+                    continue
+                b, idx = _read_n(data, idx, length)
+                try:
+                    value = str(b, "utf-8")
+                except UnicodeDecodeError as e:
+                    raise CBORDecodeError("Invalid UTF-8 text string") from e
+            elif major == 4:
+                if length == 0:
+                    value = []
+                else:
+                    stack.append([_ARRAY, length, [], None])
+                    continue
+            elif major == 5:
+                if length == 0:
+                    value = {}
+                else:
+                    stack.append([_MAP, length, {}, _NO_KEY])
+                    continue
+            else:
+                # Tag (major 6); ignore it and let the next item stand in its place.
+                if length is None:
+                    raise CBORDecodeError(f"Invalid additional info: {addl}")
+                continue
+
+        # Hand the finished value to its parent, closing every container that
+        # it completes along the way.
+        while True:
+            if not stack:
+                if value is _BREAK:
+                    raise CBORDecodeError("Unexpected break outside of indefinite-length item")
+                return value, idx
+            frame = stack[-1]
+            kind = frame[0]
+
+            if value is _BREAK:
+                if kind == _ARRAY:
+                    if frame[1] is not None:
+                        raise CBORDecodeError("Unexpected break in definite-length array")
+                    value = frame[2]
+                elif kind == _MAP:
+                    if frame[1] is not None:
+                        raise CBORDecodeError("Unexpected break in definite-length map")
+                    if frame[3] is not _NO_KEY:
+                        raise CBORDecodeError("Unexpected break in indefinite-length map value")
+                    value = frame[2]
+                elif kind == _BYTES_CHUNKS:
+                    value = b"".join(frame[2])
+                else:
+                    value = "".join(frame[2])
+                stack.pop()
+                continue
+
+            if kind == _ARRAY:
+                frame[2].append(value)
+            elif kind == _MAP:
+                if frame[3] is _NO_KEY:
+                    frame[3] = bytes(value) if type(value) is memoryview else value
                     break
-                if not isinstance(chunk, (bytes, bytearray)):
+                frame[2][frame[3]] = value
+                frame[3] = _NO_KEY
+            elif kind == _BYTES_CHUNKS:
+                if not isinstance(value, (bytes, bytearray, memoryview)):
                     raise CBORDecodeError("Indefinite byte string contained non-bytes chunk")
-                chunks.append(bytes(chunk))
-            return b"".join(chunks), idx
-        b, idx = _read_n(data, idx, int(length))
-        return b, idx
-
-    if major == 3:
-        if length is None:
-            parts = []
-            while True:
-                part, idx = _decode(data, idx)
-                if part is _BREAK:
-                    break
-                if not isinstance(part, str):
+                frame[2].append(value)
+                break
+            else:
+                if not isinstance(value, str):
                     raise CBORDecodeError("Indefinite text string contained non-text chunk")
-                parts.append(part)
-            return "".join(parts), idx
-        b, idx = _read_n(data, idx, int(length))
-        try:
-            return b.decode("utf-8"), idx
-        except UnicodeDecodeError as e:
-            raise CBORDecodeError("Invalid UTF-8 text string") from e
-
-    if major == 4:
-        if length is None:
-            items = []
-            while True:
-                item, idx = _decode(data, idx)
-                if item is _BREAK:
-                    break
-                items.append(item)
-            return items, idx
-        items = []
-        for _ in range(int(length)):
-            item, idx = _decode(data, idx)
-            if item is _BREAK:
-                raise CBORDecodeError("Unexpected break in definite-length array")
-            items.append(item)
-        return items, idx
-
-    if major == 5:
-        if length is None:
-            m = {}
-            while True:
-                k, idx = _decode(data, idx)
-                if k is _BREAK:
-                    break
-                v, idx = _decode(data, idx)
-                if v is _BREAK:
-                    raise CBORDecodeError("Unexpected break in indefinite-length map value")
-                m[k] = v
-            return m, idx
-        m = {}
-        for _ in range(int(length)):
-            k, idx = _decode(data, idx)
-            v, idx = _decode(data, idx)
-            if k is _BREAK or v is _BREAK:
-                raise CBORDecodeError("Unexpected break in definite-length map")
-            m[k] = v
-        return m, idx
-
-    if major == 6:
-        # Tag; ignore and return the tagged value.
-        # length is the tag number.
-        _tag = length
-        value, idx = _decode(data, idx)
-        return value, idx
-
-    if major == 7:
-        if addl == 20:
-            return False, idx
-        if addl == 21:
-            return True, idx
-        if addl == 22:
-            return None, idx
-        if addl == 23:
-            # Undefined; map to None for simplicity.
-            return None, idx
-        if addl == 24:
-            b, idx = _read_n(data, idx, 1)
-            return b[0], idx
-        if addl == 25:
-            b, idx = _read_n(data, idx, 2)
-            return _half_to_float(struct.unpack("!H", b)[0]), idx
-        if addl == 26:
-            b, idx = _read_n(data, idx, 4)
-            return struct.unpack("!f", b)[0], idx
-        if addl == 27:
-            b, idx = _read_n(data, idx, 8)
-            return struct.unpack("!d", b)[0], idx
-        if addl == 31:
-            return _BREAK, idx
-        # Unassigned simple values: return the raw addl info.
-        return addl, idx
-
-    raise CBORDecodeError(f"Unsupported major type: {major}")
-
-
-def _half_to_float(h: int) -> float:
-    # IEEE 754 half-precision to float.
-    sign = (h >> 15) & 0x1
-    exp = (h >> 10) & 0x1F
-    frac = h & 0x3FF
-
-    if exp == 0:
-        if frac == 0:
-            return -0.0 if sign else 0.0
-        # Subnormal.
-        return (-1.0 if sign else 1.0) * (frac / 2**10) * 2**(-14)
-
-    if exp == 0x1F:
-        if frac == 0:
-            return float("-inf") if sign else float("inf")
-        return float("nan")
+                frame[2].append(value)
+                break
+
+            if frame[1] is None:
+                break
+            frame[1] -= 1
+            if frame[1]:
+                break
+            value = frame[2]
+            stack.pop()
+
+
+def _decode_simple(data: memoryview, idx: int, addl: int) -> Tuple[Any, int]:
+    if addl == 20:
+        return False, idx
+    if addl == 21:
+        return True, idx
+    if addl == 22:
+        return None, idx
+    if addl == 23:
+        # Undefined; map to None for simplicity.
+        return None, idx
+    if addl == 24:
+        if idx >= len(data):
+            raise CBORDecodeError("Unexpected end of data")
+        return data[idx], idx + 1
+    if addl == 25:
+        return _unpack(_S_e, data, idx)
+    if addl == 26:
+        return _unpack(_S_f, data, idx)
+    if addl == 27:
+        return _unpack(_S_d, data, idx)
+    if addl == 31:
+        return _BREAK, idx
+    # Unassigned simple values: return the raw addl info.
+    return addl, idx
 
-    return (-1.0 if sign else 1.0) * (1.0 + frac / 2**10) * 2 ** (exp - 15)
 
+# Prefer the compiled implementation (see cbor_c.pyx) when it has been built.
+try:
+    from cbor_c import dumps, loads  # type: ignore  # noqa: F401,E402
+except ImportError:
+    pass
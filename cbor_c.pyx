@@ -0,0 +1,381 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled CBOR encoder/decoder.
+
+Drop-in replacement for `cbor.loads`/`cbor.dumps` covering the same subset
+of types; `cbor` picks these up automatically when the extension is built:
+
+    cythonize -i cbor_c.pyx
+
+As in `cbor`, definite-length byte strings decode to memoryview slices of
+read-only input rather than copies; writable input and map keys get `bytes`.
+"""
+
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize, PyBytes_GET_SIZE
+from cpython.mem cimport PyMem_Free, PyMem_Malloc, PyMem_Realloc
+from cpython.unicode cimport PyUnicode_AsUTF8String, PyUnicode_DecodeUTF8
+from libc.stdint cimport uint32_t, uint64_t
+from libc.string cimport memcpy
+
+import struct
+
+from cbor import CBORDecodeError, CBOREncodeError
+
+cdef object _BREAK = object()
+cdef object _S_e = struct.Struct("!e")
+
+# Nesting is handled by C recursion here, so bound it to stay off the C stack limit.
+cdef int _MAX_DEPTH = 10000
+
+
+def loads(data):
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise TypeError("cbor.loads expects a bytes-like object")
+    mv = memoryview(data).cast("B")
+    cdef const unsigned char[::1] view = mv
+    cdef Py_ssize_t n = view.shape[0]
+    cdef Py_ssize_t idx = 0
+    if n == 0:
+        raise CBORDecodeError("Unexpected end of data")
+    # Views into a writable buffer would change under the caller (and are
+    # unhashable), so only read-only input is sliced; None means copy.
+    value = _decode(mv if mv.readonly else None, &view[0], n, &idx, 0)
+    if value is _BREAK:
+        raise CBORDecodeError("Unexpected break outside of indefinite-length item")
+    if idx != n:
+        raise CBORDecodeError(f"Trailing bytes after CBOR object: {n - idx}")
+    return value
+
+
+cdef inline int _need(Py_ssize_t n, Py_ssize_t idx, uint64_t k) except -1:
+    if k > <uint64_t>(n - idx):
+        raise CBORDecodeError("Unexpected end of data")
+    return 0
+
+
+cdef inline uint64_t _read_be(const unsigned char* p, int k):
+    cdef uint64_t v = 0
+    cdef int i
+    for i in range(k):
+        v = (v << 8) | p[i]
+    return v
+
+
+cdef int _read_len(const unsigned char* data, Py_ssize_t n, Py_ssize_t* idx,
+                   int addl, uint64_t* out) except -1:
+    """Read the length/value for `addl`; return 0 for indefinite length."""
+    cdef int k
+    if addl < 24:
+        out[0] = addl
+        return 1
+    if addl == 24:
+        k = 1
+    elif addl == 25:
+        k = 2
+    elif addl == 26:
+        k = 4
+    elif addl == 27:
+        k = 8
+    elif addl == 31:
+        return 0
+    else:
+        raise CBORDecodeError(f"Invalid additional info: {addl}")
+    _need(n, idx[0], k)
+    out[0] = _read_be(data + idx[0], k)
+    idx[0] += k
+    return 1
+
+
+cdef object _decode(object mv, const unsigned char* data, Py_ssize_t n, Py_ssize_t* idx, int depth):
+    # `mv` is the Python view over `data`; byte strings are sliced from it,
+    # or copied when it is None.
+    cdef unsigned char initial
+    cdef int major, addl
+    cdef uint64_t length = 0
+    cdef bint definite
+    cdef uint32_t u32
+    cdef uint64_t u64
+    cdef float f32
+    cdef double f64
+    cdef uint64_t i
+    cdef Py_ssize_t start
+
+    if depth > _MAX_DEPTH:
+        raise CBORDecodeError("CBOR nesting too deep")
+    _need(n, idx[0], 1)
+    initial = data[idx[0]]
+    idx[0] += 1
+    major = initial >> 5
+    addl = initial & 0x1F
+
+    if major == 7:
+        if addl == 20:
+            return False
+        if addl == 21:
+            return True
+        if addl == 22 or addl == 23:
+            # Undefined maps to None, as in the pure-Python decoder.
+            return None
+        if addl == 24:
+            _need(n, idx[0], 1)
+            idx[0] += 1
+            return data[idx[0] - 1]
+        if addl == 25:
+            _need(n, idx[0], 2)
+            start = idx[0]
+            idx[0] += 2
+            return _S_e.unpack(PyBytes_FromStringAndSize(<const char*>data + start, 2))[0]
+        if addl == 26:
+            _need(n, idx[0], 4)
+            u32 = <uint32_t>_read_be(data + idx[0], 4)
+            idx[0] += 4
+            memcpy(&f32, &u32, 4)
+            return <double>f32
+        if addl == 27:
+            _need(n, idx[0], 8)
+            u64 = _read_be(data + idx[0], 8)
+            idx[0] += 8
+            memcpy(&f64, &u64, 8)
+            return f64
+        if addl == 31:
+            return _BREAK
+        # Unassigned simple values: return the raw addl info.
+        return addl
+
+    definite = _read_len(data, n, idx, addl, &length)
+
+    if major == 0:
+        if not definite:
+            raise CBORDecodeError(f"Invalid additional info: {addl}")
+        return length
+
+    if major == 1:
+        if not definite:
+            raise CBORDecodeError(f"Invalid additional info: {addl}")
+        return -1 - <object>length
+
+    if major == 2:
+        if definite:
+            _need(n, idx[0], length)
+            start = idx[0]
+            idx[0] += <Py_ssize_t>length
+            if mv is None:
+                return PyBytes_FromStringAndSize(<const char*>data + start, <Py_ssize_t>length)
+            return mv[start:idx[0]]
+        chunks = []
+        while True:
+            chunk = _decode(mv, data, n, idx, depth + 1)
+            if chunk is _BREAK:
+                break
+            if not isinstance(chunk, (bytes, bytearray, memoryview)):
+                raise CBORDecodeError("Indefinite byte string contained non-bytes chunk")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    if major == 3:
+        if definite:
+            _need(n, idx[0], length)
+            start = idx[0]
+            idx[0] += <Py_ssize_t>length
+            try:
+                return PyUnicode_DecodeUTF8(<const char*>data + start, <Py_ssize_t>length, NULL)
+            except UnicodeDecodeError as e:
+                raise CBORDecodeError("Invalid UTF-8 text string") from e
+        parts = []
+        while True:
+            part = _decode(mv, data, n, idx, depth + 1)
+            if part is _BREAK:
+                break
+            if not isinstance(part, str):
+                raise CBORDecodeError("Indefinite text string contained non-text chunk")
+            parts.append(part)
+        return "".join(parts)
+
+    if major == 4:
+        items = []
+        if definite:
+            i = 0
+            while i < length:
+                item = _decode(mv, data, n, idx, depth + 1)
+                if item is _BREAK:
+                    raise CBORDecodeError("Unexpected break in definite-length array")
+                items.append(item)
+                i += 1
+            return items
+        while True:
+            item = _decode(mv, data, n, idx, depth + 1)
+            if item is _BREAK:
+                return items
+            items.append(item)
+
+    if major == 5:
+        m = {}
+        if definite:
+            i = 0
+            while i < length:
+                k = _decode(mv, data, n, idx, depth + 1)
+                v = _decode(mv, data, n, idx, depth + 1)
+                if k is _BREAK or v is _BREAK:
+                    raise CBORDecodeError("Unexpected break in definite-length map")
+                if type(k) is memoryview:
+                    k = bytes(k)
+                m[k] = v
+                i += 1
+            return m
+        while True:
+            k = _decode(mv, data, n, idx, depth + 1)
+            if k is _BREAK:
+                return m
+            v = _decode(mv, data, n, idx, depth + 1)
+            if v is _BREAK:
+                raise CBORDecodeError("Unexpected break in indefinite-length map value")
+            if type(k) is memoryview:
+                k = bytes(k)
+            m[k] = v
+
+    # Tag (major 6); ignore it and return the tagged value.
+    if not definite:
+        raise CBORDecodeError(f"Invalid additional info: {addl}")
+    return _decode(mv, data, n, idx, depth + 1)
+
+
+cdef struct _Buf:
+    char* data
+    Py_ssize_t size
+    Py_ssize_t cap
+
+
+cdef int _reserve(_Buf* buf, Py_ssize_t extra) except -1:
+    cdef Py_ssize_t cap = buf.cap
+    cdef char* grown
+    if buf.size + extra <= cap:
+        return 0
+    while cap < buf.size + extra:
+        cap *= 2
+    grown = <char*>PyMem_Realloc(buf.data, cap)
+    if grown == NULL:
+        raise MemoryError()
+    buf.data = grown
+    buf.cap = cap
+    return 0
+
+
+cdef int _write_raw(_Buf* buf, const char* src, Py_ssize_t k) except -1:
+    _reserve(buf, k)
+    memcpy(buf.data + buf.size, src, k)
+    buf.size += k
+    return 0
+
+
+cdef int _write_be(_Buf* buf, uint64_t v, int k) except -1:
+    cdef int i
+    _reserve(buf, k)
+    for i in range(k):
+        buf.data[buf.size + k - 1 - i] = <char>(v & 0xFF)
+        v >>= 8
+    buf.size += k
+    return 0
+
+
+cdef int _write_head(_Buf* buf, int major, uint64_t length) except -1:
+    _reserve(buf, 9)
+    if length < 24:
+        buf.data[buf.size] = <char>((major << 5) | length)
+        buf.size += 1
+    elif length < 256:
+        buf.data[buf.size] = <char>((major << 5) | 24)
+        buf.size += 1
+        _write_be(buf, length, 1)
+    elif length < 65536:
+        buf.data[buf.size] = <char>((major << 5) | 25)
+        buf.size += 1
+        _write_be(buf, length, 2)
+    elif length < 4294967296ULL:
+        buf.data[buf.size] = <char>((major << 5) | 26)
+        buf.size += 1
+        _write_be(buf, length, 4)
+    else:
+        buf.data[buf.size] = <char>((major << 5) | 27)
+        buf.size += 1
+        _write_be(buf, length, 8)
+    return 0
+
+
+cdef int _write_int(_Buf* buf, object obj) except -1:
+    cdef int major = 0
+    if obj < 0:
+        major = 1
+        obj = -1 - obj
+    if obj >= 18446744073709551616:
+        raise CBOREncodeError("Length too large")
+    _write_head(buf, major, <uint64_t>obj)
+    return 0
+
+
+cdef int _encode(_Buf* buf, object obj, int depth) except -1:
+    cdef double f64
+    cdef uint64_t u64
+    cdef char byte
+
+    if depth > _MAX_DEPTH:
+        raise CBOREncodeError("Object nesting too deep for CBOR encoding")
+
+    if obj is None:
+        byte = <char>0xF6
+        return _write_raw(buf, &byte, 1)
+    if obj is False:
+        byte = <char>0xF4
+        return _write_raw(buf, &byte, 1)
+    if obj is True:
+        byte = <char>0xF5
+        return _write_raw(buf, &byte, 1)
+
+    if isinstance(obj, int):
+        return _write_int(buf, obj)
+
+    if isinstance(obj, float):
+        # Encode as float64.
+        f64 = obj
+        memcpy(&u64, &f64, 8)
+        byte = <char>0xFB
+        _write_raw(buf, &byte, 1)
+        return _write_be(buf, u64, 8)
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        b = obj if type(obj) is bytes else bytes(obj)
+        _write_head(buf, 2, PyBytes_GET_SIZE(b))
+        return _write_raw(buf, PyBytes_AS_STRING(b), PyBytes_GET_SIZE(b))
+
+    if isinstance(obj, str):
+        b = PyUnicode_AsUTF8String(obj)
+        _write_head(buf, 3, PyBytes_GET_SIZE(b))
+        return _write_raw(buf, PyBytes_AS_STRING(b), PyBytes_GET_SIZE(b))
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        _write_head(buf, 4, len(obj))
+        for item in obj:
+            _encode(buf, item, depth + 1)
+        return 0
+
+    if isinstance(obj, dict):
+        _write_head(buf, 5, len(obj))
+        for k, v in obj.items():
+            _encode(buf, k, depth + 1)
+            _encode(buf, v, depth + 1)
+        return 0
+
+    raise CBOREncodeError(f"Unsupported type for CBOR encoding: {type(obj)!r}")
+
+
+def dumps(obj):
+    cdef _Buf buf
+    buf.size = 0
+    buf.cap = 256
+    buf.data = <char*>PyMem_Malloc(buf.cap)
+    if buf.data == NULL:
+        raise MemoryError()
+    try:
+        _encode(&buf, obj, 0)
+        return PyBytes_FromStringAndSize(buf.data, buf.size)
+    finally:
+        PyMem_Free(buf.data)
@@ -1,7 +1,8 @@
+import heapq
 import os
 import sqlite3
 import time
-from collections import deque
+from collections import defaultdict, deque
 from threading import Condition, RLock
 from urllib.parse import urldefrag, urlparse
 
@@ -9,6 +10,14 @@ from scraper import is_valid
 from utils import get_logger, get_urlhash, normalize
 
 
+_URLHASH_LEN = len(get_urlhash("http://example.com/"))
+
+# Writes to the save file are buffered and committed in one transaction once
+# either limit is reached (and whenever the frontier closes).
+_FLUSH_EVERY_URLS = 500
+_FLUSH_EVERY_SECONDS = 2.0
+
+
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
@@ -21,8 +30,17 @@ class Frontier(object):
         self._domain_next_allowed_at = {}
         self._seen_hashes = set()
         self._queued_hashes = set()
+        self._pending_inserts = []
+        self._pending_completed = []
+        self._last_flush_at = time.monotonic()
 
-        self.to_be_downloaded = deque()
+        # Queued urls grouped by host, plus a min-heap of (ready_at, host) with
+        # exactly one entry per host that has queued urls. get_tbd_url hands
+        # out the earliest-ready host's next url, so workers never sleep on a
+        # host that is still cooling down while another host has work.
+        self._per_host = defaultdict(deque)
+        self._host_ready = []
+        self._queued_count = 0
 
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
@@ -48,6 +66,9 @@ class Frontier(object):
         try:
             self._db.execute("PRAGMA journal_mode=WAL;")
             self._db.execute("PRAGMA synchronous=NORMAL;")
+            self._db.execute("PRAGMA mmap_size=268435456;")  # 256 MiB
+            self._db.execute("PRAGMA cache_size=-65536;")  # 64 MiB
+            self._db.execute("PRAGMA temp_store=MEMORY;")
         except sqlite3.DatabaseError:
             pass
 
@@ -73,53 +94,97 @@ class Frontier(object):
         """This function can be overridden for alternate saving techniques."""
         tbd_count = 0
         total_count = 0
-        for urlhash, url, completed in self._db.execute(
-            "SELECT urlhash, url, completed FROM urls;"
-        ):
-            total_count += 1
-            self._seen_hashes.add(urlhash)
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                self._queued_hashes.add(urlhash)
-                tbd_count += 1
+        rehashed = []
+        # Completed rows only contribute their hash to the seen-set, so only
+        # fetch the url where it is needed (pending rows, or rows to re-key).
+        cursor = self._db.execute(
+            "SELECT urlhash, completed, "
+            "CASE WHEN completed = 0 OR length(urlhash) != ? THEN url END "
+            "FROM urls;",
+            (_URLHASH_LEN,),
+        )
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for urlhash, completed, url in rows:
+                total_count += 1
+                if len(urlhash) != _URLHASH_LEN:
+                    # Save file written with an older url hash; re-key the row.
+                    new_hash = get_urlhash(url)
+                    rehashed.append((new_hash, urlhash))
+                    urlhash = new_hash
+                self._seen_hashes.add(urlhash)
+                if not completed and is_valid(url):
+                    self._enqueue_locked(url, urlhash)
+                    tbd_count += 1
+        if rehashed:
+            # One transaction: autocommit would sync once per row, and a
+            # crash partway would leave the file half re-keyed.
+            self._db.execute("BEGIN;")
+            try:
+                self._db.executemany(
+                    "UPDATE OR IGNORE urls SET urlhash = ? WHERE urlhash = ?;",
+                    rehashed,
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK;")
+                raise
+            self._db.execute("COMMIT;")
+            self.logger.info(f"Re-keyed {len(rehashed)} urls from an older save file.")
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
     def get_tbd_url(self):
         with self._cv:
-            while not self._closed and not self.to_be_downloaded:
-                # If no work is queued and no worker is processing a URL, we're done.
-                if self._in_progress == 0:
-                    self._closed = True
-                    self._cv.notify_all()
+            while True:
+                if self._closed:
                     return None
-                self._cv.wait()
+                if not self._host_ready:
+                    # If no work is queued and no worker is processing a URL, we're done.
+                    if self._in_progress == 0:
+                        self._close_locked()
+                        return None
+                    self._cv.wait()
+                    continue
 
-            if self._closed:
-                return None
-
-            url = self.to_be_downloaded.pop()
-            urlhash = get_urlhash(normalize(urldefrag(url)[0]))
-            self._queued_hashes.discard(urlhash)
-            self._in_progress += 1
-            return url
-
-    def wait_for_politeness(self, url):
-        parsed = urlparse(url)
-        domain = (parsed.hostname or "").lower()
-        if not domain:
-            return
-
-        while True:
-            with self._cv:
+                ready_at, domain = self._host_ready[0]
                 now = time.monotonic()
-                allowed_at = self._domain_next_allowed_at.get(domain, 0.0)
-                if now >= allowed_at:
-                    self._domain_next_allowed_at[domain] = now + self.config.time_delay
-                    return
-                wait_s = allowed_at - now
-            time.sleep(wait_s)
+                if ready_at > now:
+                    # Every queued host is still within its politeness delay;
+                    # wait for the first to free up (or for new work).
+                    self._cv.wait(ready_at - now)
+                    continue
+
+                heapq.heappop(self._host_ready)
+                queue = self._per_host[domain]
+                # Per-host FIFO keeps the crawl breadth-first within a host.
+                url = queue.popleft()
+                self._queued_count -= 1
+
+                # Reserve the host's next slot now; the caller is about to fetch.
+                allowed_at = now + self.config.time_delay if domain else now
+                self._domain_next_allowed_at[domain] = allowed_at
+                if queue:
+                    heapq.heappush(self._host_ready, (allowed_at, domain))
+                else:
+                    del self._per_host[domain]
+
+                # Queued urls are already defragmented and normalized.
+                self._queued_hashes.discard(get_urlhash(url))
+                self._in_progress += 1
+                return url
+
+    def _enqueue_locked(self, url, urlhash):
+        domain = (urlparse(url).hostname or "").lower()
+        if domain not in self._per_host:
+            heapq.heappush(
+                self._host_ready,
+                (self._domain_next_allowed_at.get(domain, 0.0), domain))
+        self._per_host[domain].append(url)
+        self._queued_count += 1
+        self._queued_hashes.add(urlhash)
 
     def add_url(self, url):
         url, _frag = urldefrag(url)
@@ -130,12 +195,9 @@ class Frontier(object):
                 return
             if urlhash not in self._seen_hashes:
                 self._seen_hashes.add(urlhash)
-                self._db.execute(
-                    "INSERT OR IGNORE INTO urls(urlhash, url, completed) VALUES(?, ?, 0);",
-                    (urlhash, url),
-                )
-                self.to_be_downloaded.append(url)
-                self._queued_hashes.add(urlhash)
+                self._pending_inserts.append((urlhash, url))
+                self._enqueue_locked(url, urlhash)
+                self._maybe_flush_locked()
                 self._cv.notify()
 
     def mark_url_complete(self, url):
@@ -148,17 +210,14 @@ class Frontier(object):
                 self.logger.error(
                     f"Completed url {url}, but have not seen it before.")
             else:
-                self._db.execute(
-                    "UPDATE urls SET completed = 1 WHERE urlhash = ?;",
-                    (urlhash,),
-                )
+                self._pending_completed.append((urlhash,))
 
             self._in_progress = max(0, self._in_progress - 1)
-            if self._in_progress == 0 and not self.to_be_downloaded:
-                self._closed = True
-                self._cv.notify_all()
+            if self._in_progress == 0 and not self._queued_count:
+                self._close_locked()
                 return
 
+            self._maybe_flush_locked()
             self._cv.notify_all()
 
     def mark_url_failed(self, url, *, requeue=True):
@@ -174,12 +233,43 @@ class Frontier(object):
             self._in_progress = max(0, self._in_progress - 1)
 
             if requeue and not self._closed and urlhash not in self._queued_hashes:
-                self.to_be_downloaded.append(url)
-                self._queued_hashes.add(urlhash)
+                self._enqueue_locked(url, urlhash)
 
-            if self._in_progress == 0 and not self.to_be_downloaded:
-                self._closed = True
-                self._cv.notify_all()
+            if self._in_progress == 0 and not self._queued_count:
+                self._close_locked()
                 return
 
             self._cv.notify_all()
+
+    def _close_locked(self):
+        self._closed = True
+        self._flush_locked()
+        self._cv.notify_all()
+
+    def _maybe_flush_locked(self):
+        pending = len(self._pending_inserts) + len(self._pending_completed)
+        if (pending >= _FLUSH_EVERY_URLS
+                or time.monotonic() - self._last_flush_at >= _FLUSH_EVERY_SECONDS):
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """Write buffered inserts/completions to the save file in one transaction."""
+        self._last_flush_at = time.monotonic()
+        if not self._pending_inserts and not self._pending_completed:
+            return
+        self._db.execute("BEGIN;")
+        try:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO urls(urlhash, url, completed) VALUES(?, ?, 0);",
+                self._pending_inserts,
+            )
+            self._db.executemany(
+                "UPDATE urls SET completed = 1 WHERE urlhash = ?;",
+                self._pending_completed,
+            )
+        except BaseException:
+            self._db.execute("ROLLBACK;")
+            raise
+        self._db.execute("COMMIT;")
+        self._pending_inserts.clear()
+        self._pending_completed.clear()
@@ -22,7 +22,6 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            self.frontier.wait_for_politeness(tbd_url)
             try:
                 resp = download(tbd_url, self.config, self.logger)
             except Exception:
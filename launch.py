@@ -32,11 +32,12 @@ def main(config_file, restart):
         except FileNotFoundError:
             pass
         except OSError:
-            # Directory may be in-use; fall back to clearing the known state file.
-            try:
-                os.remove(os.path.join("analytics", "state.pkl"))
-            except FileNotFoundError:
-                pass
+            # Directory may be in-use; fall back to clearing the known state files.
+            for name in ("state.pkl", "state.log", "urls.bin"):
+                try:
+                    os.remove(os.path.join("analytics", name))
+                except FileNotFoundError:
+                    pass
 
     cparser = ConfigParser()
     cparser.read(config_file)
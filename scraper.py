@@ -1,10 +1,49 @@
 import re
 from html.parser import HTMLParser
-from urllib.parse import parse_qsl, urldefrag, urljoin, urlparse
+from urllib.parse import parse_qsl, urldefrag, urljoin, urlparse, urlsplit
 
 from utils.analytics import analytics
 from utils.pythonpath import add_base_site_packages
 
+try:
+    from lxml import etree  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        from lxml import etree  # type: ignore
+    except ModuleNotFoundError:
+        etree = None  # type: ignore
+
+_SKIP_TAGS = frozenset(("script", "style", "noscript"))
+_PULL_CHUNK_SIZE = 64 * 1024
+
+_ALLOWED_SCHEMES = frozenset(("http", "https"))
+_ALLOWED_DOMAINS = (
+    "ics.uci.edu",
+    "cs.uci.edu",
+    "informatics.uci.edu",
+    "stat.uci.edu",
+)
+_ALLOWED_EXACT = frozenset(_ALLOWED_DOMAINS)
+_ALLOWED_SUFFIXES = tuple("." + d for d in _ALLOWED_DOMAINS)
+
+# Absolute (http/https), scheme-relative and root-relative hrefs; see _join_href.
+_FAST_HREF_RE = re.compile(r"(https?:)?//[^/?#]|/(?!/)")
+# Anything urljoin would rewrite on the way through urlsplit/urlunsplit.
+_JOIN_REWRITES_RE = re.compile(r"[\[\];\t\n\r]|/\.|\?#|[?#]\Z")
+
+_BAD_QUERY_RE = re.compile(r"(?:replytocom=|session=|sid=|phpsessid=|jsessionid=|utm_)")
+_BAD_EXTS = frozenset((
+    "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz",
+))
+
 def scraper(url, resp):
     links = extract_next_links(url, resp)
     return [link for link in links if is_valid(link)]
@@ -38,6 +77,114 @@ class _FallbackHTMLParser(HTMLParser):
     def text(self) -> str:
         return " ".join(self._text_parts)
 
+def _content_encoding(content, content_type):
+    """
+    Pick the input encoding for an lxml parse of `content`.
+
+    lxml falls back to latin-1 for bytes without a <meta charset>, so prefer
+    the Content-Type charset, then UTF-8 if the bytes decode cleanly; None
+    lets lxml sniff the document itself.
+    """
+    if not isinstance(content, (bytes, bytearray)):
+        return None
+    _, sep, charset = content_type.partition("charset=")
+    if sep:
+        encoding = charset.split(";", 1)[0].strip().strip("\"'")
+        if encoding:
+            return encoding
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    return "utf-8"
+
+def _join_href(base_url, base_scheme, base_origin, href):
+    """
+    urljoin(base_url, href), skipping the parse for the common href shapes.
+
+    Absolute and scheme-relative hrefs resolve to themselves (with the base
+    scheme prefixed) and root-relative ones to the base origin plus the href.
+    Anything urljoin would rewrite - dot segments, stripped whitespace, empty
+    query/fragment, path params, IPv6 hosts - still goes through urljoin.
+    """
+    m = _FAST_HREF_RE.match(href)
+    if m is None or base_origin is None or _JOIN_REWRITES_RE.search(href):
+        return urljoin(base_url, href)
+    if m.group(1):
+        return href
+    if href.startswith("//"):
+        return f"{base_scheme}:{href}"
+    return base_origin + href
+
+def _pull_parse(content, content_type):
+    """
+    Stream `content` through lxml's HTMLPullParser in fixed-size chunks.
+
+    Returns (base_href, text, hrefs). Elements are cleared as soon as they
+    close, so the tree is never fully materialized. An element's text/tail
+    is only complete once the parser has moved past it, so each is read on
+    the following event.
+    """
+    if isinstance(content, bytearray):
+        content = bytes(content)
+    events = ("start", "end", "comment", "pi")
+    try:
+        parser = etree.HTMLPullParser(events=events, encoding=_content_encoding(content, content_type))
+    except LookupError:
+        parser = etree.HTMLPullParser(events=events)
+
+    def read_events():
+        for i in range(0, len(content), _PULL_CHUNK_SIZE):
+            parser.feed(content[i:i + _PULL_CHUNK_SIZE])
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+        yield None, None  # Flush the last pending text/tail.
+
+    base_href = None
+    hrefs = []
+    text_parts = []
+    skip_depth = 0
+    text_owner = None
+    tail_owner = None
+    for event, el in read_events():
+        if text_owner is not None:
+            if not skip_depth and text_owner.text:
+                text = text_owner.text.strip()
+                if text:
+                    text_parts.append(text)
+            text_owner = None
+        if tail_owner is not None:
+            if not skip_depth and tail_owner.tail:
+                text = tail_owner.tail.strip()
+                if text:
+                    text_parts.append(text)
+            tail_owner = None
+
+        if event == "start":
+            tag = el.tag
+            if tag in _SKIP_TAGS:
+                skip_depth += 1
+            elif skip_depth:
+                pass
+            elif tag == "a":
+                href = el.get("href")
+                if href is not None:
+                    hrefs.append(href)
+            elif tag == "base" and base_href is None:
+                base_href = el.get("href") or None
+            text_owner = el
+        elif event == "end":
+            if el.tag in _SKIP_TAGS and skip_depth:
+                skip_depth -= 1
+            tail_owner = el
+            el.clear(keep_tail=True)
+        elif event is not None:
+            # Comment or processing instruction: skip its text, keep its tail.
+            tail_owner = el
+
+    return base_href, " ".join(text_parts), hrefs
+
 def extract_next_links(url, resp):
     # Implementation required.
     # url: the URL that was used to get the page
@@ -59,7 +206,8 @@ def extract_next_links(url, resp):
     page_url, _frag = urldefrag(page_url)
     base_url = page_url
 
-    out = set()
+    # Insertion-ordered, so outlinks keep page order for the frontier.
+    out = {}
     extracted_text = ""
 
     headers = getattr(resp.raw_response, "headers", None)
@@ -73,51 +221,41 @@ def extract_next_links(url, resp):
     if isinstance(content, (bytes, bytearray)) and len(content) > 5_000_000:
         return []
 
-    soup = None
-    try:
-        from bs4 import BeautifulSoup, FeatureNotFound  # type: ignore
-    except ModuleNotFoundError:
-        add_base_site_packages()
+    hrefs = None
+    if etree is not None:
         try:
-            from bs4 import BeautifulSoup, FeatureNotFound  # type: ignore
+            base_href, extracted_text, hrefs = _pull_parse(content, content_type)
+        except Exception:
+            hrefs = None
+        else:
+            if base_href and base_href.strip():
+                base_url = urljoin(page_url, base_href.strip())
+
+    if hrefs is None and etree is None:
+        # lxml is missing; BeautifulSoup's bundled parser is the next best thing.
+        try:
+            from bs4 import BeautifulSoup  # type: ignore
         except ModuleNotFoundError:
             BeautifulSoup = None  # type: ignore
-            FeatureNotFound = Exception  # type: ignore
 
-    if soup is None and "BeautifulSoup" in locals() and BeautifulSoup is not None:  # type: ignore
-        try:
-            soup = BeautifulSoup(content, "lxml")  # type: ignore
-        except Exception:
+        soup = None
+        if BeautifulSoup is not None:
             try:
                 soup = BeautifulSoup(content, "html.parser")  # type: ignore
             except Exception:
                 soup = None
 
-    if soup is not None:
-        base_tag = soup.find("base", href=True)
-        if base_tag and base_tag.get("href"):
-            base_url = urljoin(page_url, base_tag.get("href").strip())
-
-        for kill in soup(["script", "style", "noscript"]):
-            kill.decompose()
-        extracted_text = soup.get_text(separator=" ", strip=True)
-
-        for a in soup.find_all("a", href=True):
-            href = a.get("href")
-            if not href:
-                continue
-            href = href.strip()
-            if not href:
-                continue
-            lower = href.lower()
-            if lower.startswith(("mailto:", "javascript:", "tel:")):
-                continue
-
-            next_url = urljoin(base_url, href)
-            next_url, _frag = urldefrag(next_url)
-            if next_url:
-                out.add(next_url)
-    else:
+        if soup is not None:
+            base_tag = soup.find("base", href=True)
+            if base_tag and base_tag.get("href"):
+                base_url = urljoin(page_url, base_tag.get("href").strip())
+
+            for kill in soup(["script", "style", "noscript"]):
+                kill.decompose()
+            extracted_text = soup.get_text(separator=" ", strip=True)
+            hrefs = [a.get("href") for a in soup.find_all("a", href=True)]
+
+    if hrefs is None:
         # Dependency-free fallback, so the crawler still works without bs4/lxml.
         if isinstance(content, (bytes, bytearray)):
             try:
@@ -134,17 +272,24 @@ def extract_next_links(url, resp):
             return []
 
         extracted_text = parser.text()
-        for href in parser.links:
-            href = (href or "").strip()
-            if not href:
-                continue
-            lower = href.lower()
-            if lower.startswith(("mailto:", "javascript:", "tel:")):
-                continue
-            next_url = urljoin(base_url, href)
-            next_url, _frag = urldefrag(next_url)
-            if next_url:
-                out.add(next_url)
+        hrefs = parser.links
+
+    base = urlsplit(base_url)
+    base_origin = None
+    if base.scheme in _ALLOWED_SCHEMES and base.netloc:
+        base_origin = f"{base.scheme}://{base.netloc}"
+
+    for href in hrefs:
+        href = (href or "").strip()
+        if not href:
+            continue
+        lower = href.lower()
+        if lower.startswith(("mailto:", "javascript:", "tel:")):
+            continue
+        next_url = _join_href(base_url, base.scheme, base_origin, href)
+        next_url, _frag = urldefrag(next_url)
+        if next_url:
+            out[next_url] = None
 
     # Update analytics for this (defragmented) URL.
     is_new = analytics.record_url(page_url)
@@ -181,22 +326,31 @@ def is_valid(url):
     # If you decide to crawl it, return True; otherwise return False.
     # There are already some conditions that return False.
     try:
+        # Cheap string-level rejections before any parsing. Without a '#'
+        # urldefrag is a no-op, so the raw length is the defragmented length.
+        if len(url) > 300 and "#" not in url:
+            return False
+        # Extension of the last path segment, minus any ;params (urlparse
+        # moves those out of the path). A url with no path after the
+        # netloc has no extension to check, and one with tabs/newlines
+        # (which urlparse deletes) is left to the parsed check below.
+        head = url.partition("#")[0].partition("?")[0]
+        slash = head.rfind("/")
+        if slash > head.find("//") + 1 and head.isprintable():
+            _, dot, ext = head[slash + 1 :].partition(";")[0].rpartition(".")
+            if dot and ext.lower() in _BAD_EXTS:
+                return False
+
         url, _frag = urldefrag(url)
         parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
+        if parsed.scheme not in _ALLOWED_SCHEMES:
             return False
 
         host = (parsed.hostname or "").lower()
         if not host:
             return False
 
-        allowed = (
-            "ics.uci.edu",
-            "cs.uci.edu",
-            "informatics.uci.edu",
-            "stat.uci.edu",
-        )
-        if not any(host == d or host.endswith("." + d) for d in allowed):
+        if host not in _ALLOWED_EXACT and not host.endswith(_ALLOWED_SUFFIXES):
             return False
 
         # Basic trap/garbage filters.
@@ -221,7 +375,7 @@ def is_valid(url):
 
         if parsed.query:
             q = parsed.query.lower()
-            if re.search(r"(?:replytocom=|session=|sid=|phpsessid=|jsessionid=|utm_)", q):
+            if _BAD_QUERY_RE.search(q):
                 return False
             params = parse_qsl(parsed.query, keep_blank_values=True)
             if len(params) > 8:
@@ -239,15 +393,8 @@ def is_valid(url):
             if ("calendar" in parsed.path.lower() or "event" in parsed.path.lower()) and len(params) >= 4:
                 return False
 
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+        _, dot, ext = parsed.path.rpartition(".")
+        return not (dot and ext.lower() in _BAD_EXTS)
 
     except TypeError:
         return False
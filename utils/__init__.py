@@ -1,7 +1,8 @@
 import os
 import logging
-from hashlib import sha256
-from urllib.parse import urldefrag, urlparse, urlunparse
+from functools import lru_cache
+from hashlib import blake2b
+from urllib.parse import urldefrag, urlsplit, urlunsplit, uses_params
 
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
@@ -24,9 +25,12 @@ def get_logger(name, filename=None):
     return logger
 
 
+@lru_cache(maxsize=65536)
 def get_urlhash(url):
-    return sha256(normalize(url).encode("utf-8")).hexdigest()
+    # 128-bit BLAKE2b: plenty for dedup keys and half the size of SHA-256 hex.
+    return blake2b(normalize(url).encode("utf-8"), digest_size=16).hexdigest()
 
+@lru_cache(maxsize=65536)
 def normalize(url):
     """
     Canonicalize a URL for crawl-deduping.
@@ -37,29 +41,41 @@ def normalize(url):
     if not url:
         return url
 
-    url, _frag = urldefrag(url)
-    parsed = urlparse(url)
+    if "#" in url:
+        # urldefrag reassembles what it splits (e.g. collapsing an empty
+        # netloc); keep its output so dedup keys don't change.
+        url, _frag = urldefrag(url)
+    parsed = urlsplit(url)  # Lowercases the scheme.
+    netloc = parsed.netloc
 
-    scheme = (parsed.scheme or "").lower()
+    # Common case: a plain, already-lowercase host needs no rebuilding.
+    if "@" in netloc or ":" in netloc or not netloc.islower():
+        hostname = (parsed.hostname or "").lower()  # Brackets stripped.
+        if hostname and ":" in hostname and not hostname.startswith("["):
+            # IPv6 host
+            hostname = f"[{hostname}]"
 
-    hostname = (parsed.hostname or "").lower()
-    if hostname and ":" in hostname and not hostname.startswith("["):
-        # IPv6 host
-        hostname = f"[{hostname}]"
+        port = parsed.port
+        scheme = parsed.scheme
+        is_default_port = (scheme == "http" and port == 80) or (scheme == "https" and port == 443)
 
-    port = parsed.port
-    is_default_port = (scheme == "http" and port == 80) or (scheme == "https" and port == 443)
+        userinfo = ""
+        if parsed.username:
+            userinfo = parsed.username
+            if parsed.password:
+                userinfo += f":{parsed.password}"
+            userinfo += "@"
 
-    userinfo = ""
-    if parsed.username:
-        userinfo = parsed.username
-        if parsed.password:
-            userinfo += f":{parsed.password}"
-        userinfo += "@"
+        if port and not is_default_port:
+            netloc = f"{userinfo}{hostname}:{port}"
+        else:
+            netloc = f"{userinfo}{hostname}"
 
-    if port and not is_default_port:
-        netloc = f"{userinfo}{hostname}:{port}"
-    else:
-        netloc = f"{userinfo}{hostname}"
+    path = parsed.path
+    if path.endswith(";") and parsed.scheme in uses_params:
+        # urlparse split ;params off the last segment and urlunparse dropped
+        # the ';' when they were empty; do the same so keys don't change.
+        if path.find(";", max(path.rfind("/"), 0)) == len(path) - 1:
+            path = path[:-1]
 
-    return urlunparse((scheme, netloc, parsed.path or "", parsed.params or "", parsed.query or "", ""))
+    return urlunsplit((parsed.scheme, netloc, path, parsed.query, ""))
@@ -1,19 +1,77 @@
 from __future__ import annotations
 
 import atexit
+import bisect
+import heapq
 import json
 import os
 import pickle
+import queue
 import re
+import struct
+import sys
 import time
+from array import array
 from collections import Counter
 from dataclasses import dataclass
-from hashlib import sha256
-from threading import RLock
-from urllib.parse import urldefrag, urlparse
+from functools import lru_cache
+from operator import itemgetter
+from hashlib import blake2b, sha256
+from threading import Lock, RLock, Thread
+from urllib.parse import urldefrag
+
+from utils.pythonpath import add_base_site_packages
+
+try:
+    import numpy as np  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        import numpy as np  # type: ignore
+    except ModuleNotFoundError:
+        np = None  # type: ignore
+
+try:
+    from numba import njit  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        from numba import njit  # type: ignore
+    except ModuleNotFoundError:
+        njit = None  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        import orjson  # type: ignore
+    except ModuleNotFoundError:
+        orjson = None  # type: ignore
+
+try:
+    import zstandard  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        import zstandard  # type: ignore
+    except ModuleNotFoundError:
+        zstandard = None  # type: ignore
+
+try:
+    import xxhash  # type: ignore
+except ModuleNotFoundError:
+    add_base_site_packages()
+    try:
+        import xxhash  # type: ignore
+    except ModuleNotFoundError:
+        xxhash = None  # type: ignore
 
 
 _WORD_RE = re.compile(r"[a-zA-Z]{2,}(?:[’'][a-zA-Z]+)*")
+# _WORD_RE for text that is already lowercase ASCII: smaller classes to test.
+_ASCII_WORD_RE = re.compile(r"[a-z]{2,}(?:'[a-z]+)*")
+_URL_NETLOC_RE = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.-]*:)?//([^/?#]*)")
 
 
 def _default_stopwords() -> set[str]:
@@ -201,11 +259,140 @@ def _default_stopwords() -> set[str]:
     }
 
 
+# SimHash only needs uniformly distributed feature hashes, not cryptographic
+# ones. Fingerprints depend on the hash, so its name is saved with the buckets.
+if xxhash is not None:
+    _feature_hash = xxhash.xxh3_64_intdigest
+    _FEATURE_HASH_NAME = "xxh3_64"
+else:
+    def _feature_hash(data: bytes) -> int:
+        return int.from_bytes(blake2b(data, digest_size=8).digest(), "little")
+
+    _FEATURE_HASH_NAME = "blake2b_64"
+
+# Whole-page digest for exact duplicates; saved by name like the feature hash.
+if xxhash is not None:
+    _page_digest = xxhash.xxh3_128_digest
+    _PAGE_DIGEST_NAME = "xxh3_128"
+else:
+    def _page_digest(data: bytes) -> bytes:
+        return sha256(data).digest()
+
+    _PAGE_DIGEST_NAME = "sha256"
+
+
+if np is not None and njit is not None:
+    @njit(cache=True, boundscheck=False)
+    def _simhash_kernel(hashes):
+        # Count the set bits per position; a bit of the fingerprint is set
+        # when at least half of the feature hashes have it set.
+        ones = np.zeros(64, np.int64)
+        for n in range(hashes.shape[0]):
+            h = hashes[n]
+            for i in range(64):
+                ones[i] += (h >> np.uint64(i)) & np.uint64(1)
+        out = np.uint64(0)
+        for i in range(64):
+            if 2 * ones[i] >= hashes.shape[0]:
+                out |= np.uint64(1) << np.uint64(i)
+        return out
+
+    # Compile now rather than on the first crawled page.
+    _simhash_kernel(np.zeros(1, np.uint64))
+else:
+    _simhash_kernel = None
+
+
+if np is None:
+    _popcount64 = None
+elif hasattr(np, "bitwise_count"):
+    _popcount64 = np.bitwise_count
+else:
+    def _popcount64(x):
+        # SWAR popcount for numpy < 2.0, which lacks bitwise_count.
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _has_near_match(bucket: array, sim: int, max_bits: int) -> bool:
+    if _popcount64 is not None and len(bucket) > 48:
+        # The view pins the array's buffer, so it must not outlive this call:
+        # the bucket may be resized right after.
+        dists = _popcount64(np.frombuffer(bucket, dtype=np.uint64) ^ np.uint64(sim))
+        return bool((dists <= max_bits).any())
+    # Below ~48 entries numpy's fixed ~4us per call outweighs the loop.
+    for cand in bucket:
+        if (sim ^ cand).bit_count() <= max_bits:
+            return True
+    return False
+
+
+def _simhash_keys(simhash: int) -> list[int]:
+    # Manku et al. (WWW '07): with the 64 bits split into 4 blocks of 16, two
+    # fingerprints at most 3 bits apart agree exactly on at least one block,
+    # so only pages sharing a block need comparing. Each block is a table;
+    # key = (block index << 16) | block value.
+    return [(i << 16) | ((simhash >> (i * 16)) & 0xFFFF) for i in range(4)]
+
+
+# Each state.log record is a big-endian u32 length followed by a pickled batch.
+_LOG_LEN = struct.Struct(">I")
+
+# Parsed stopword files by (path, mtime_ns), so constructing another
+# Analytics doesn't re-read an unchanged file.
+_STOPWORDS_CACHE: dict[tuple[str, int], frozenset[str]] = {}
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _url_key(url_key: str) -> int:
+    # Persisted across runs, so it must be stable: no hash() (randomized per
+    # process) and no optional dependency. 64 bits are plenty for membership.
+    return int.from_bytes(blake2b(url_key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _legacy_url_key(url_key: str) -> int:
+    # What state files written before the switch to blake2b stored.
+    return int.from_bytes(sha256(url_key.encode("utf-8")).digest()[:8], "little")
+
+
+def _top_words(word_frequencies: Counter[str], stopwords: frozenset[str], n: int) -> list[tuple[str, int]]:
+    # Same result as a stable descending sort truncated to n, in O(N log n).
+    items = ((w, c) for w, c in word_frequencies.items() if w not in stopwords)
+    return heapq.nlargest(n, items, key=itemgetter(1))
+
+
 def _defrag_url(url: str) -> str:
     url, _frag = urldefrag(url)
     return url
 
 
+@lru_cache(maxsize=65536)
+def _split_url(url: str) -> tuple[str, str]:
+    """
+    Return (url without fragment, lowercased host), like _defrag_url plus
+    urlparse(...).hostname but without building parse results.
+
+    Cached: record_url and record_words are called with the same page URL.
+    """
+    if "#" in url:
+        # urldefrag also normalizes what it reassembles; keep its output so
+        # uniqueness keys don't change.
+        url = _defrag_url(url)
+    m = _URL_NETLOC_RE.match(url)
+    if m is None:
+        return url, ""
+    # Same host extraction as urllib's SplitResult.hostname.
+    hostinfo = m.group(1).rpartition("@")[2]
+    _, bracket, bracketed = hostinfo.partition("[")
+    if bracket:
+        host = bracketed.partition("]")[0]
+    else:
+        host = hostinfo.partition(":")[0]
+    return url, host.lower()
+
+
 @dataclass(slots=True)
 class LongestPage:
     url: str = ""
@@ -223,33 +410,73 @@ class Analytics:
         self,
         out_dir: str = "analytics",
         state_file: str = "state.pkl",
+        log_file: str = "state.log",
+        url_file: str = "urls.bin",
         save_every_pages: int = 250,
         save_every_seconds: float = 60.0,
+        compact_every_seconds: float = 600.0,
     ):
         self._lock = RLock()
         self.out_dir = out_dir
         self.state_path = os.path.join(out_dir, state_file)
+        self.log_path = os.path.join(out_dir, log_file)
+        self.url_path = os.path.join(out_dir, url_file)
         self.save_every_pages = save_every_pages
         self.save_every_seconds = save_every_seconds
+        self.compact_every_seconds = compact_every_seconds
 
         self.stopwords = _default_stopwords()
         self._load_stopwords_file()
+        self.stopwords = frozenset(self.stopwords)
 
         # Report metrics
-        self.unique_url_hashes: set[bytes] = set()
+        self.unique_url_hashes: set[int] = set()
+        # Keys loaded from an older state file, made with _legacy_url_key.
+        self._legacy_url_hashes: set[int] = set()
         self.subdomain_counts: Counter[str] = Counter()
         self.word_frequencies: Counter[str] = Counter()
         self.longest_page = LongestPage()
+        # Bumped whenever word_frequencies changes; keys the top_words cache.
+        self._wf_version = 0
+        self._top_words_cache: tuple[int, int, list[tuple[str, int]]] | None = None
 
         # Similarity detection (extra credit): exact + near duplicates
         self._exact_digests: set[bytes] = set()
-        self._simhash_buckets: dict[int, set[int]] = {}
+        # Each bucket is a sorted array of unsigned 64-bit fingerprints: 8
+        # bytes per entry instead of a boxed int in a set.
+        self._simhash_buckets: dict[int, array] = {}
         self.duplicate_exact = 0
         self.duplicate_near = 0
         self.skipped_lowinfo = 0
 
         self._dirty_pages = 0
         self._last_save_at = time.monotonic()
+        self._last_compact_at = self._last_save_at
+
+        # Persistence is a full snapshot (state.pkl) plus an append-only log
+        # of the events since (state.log). Each mutation appends an event to
+        # _events; periodic saves ship them to a background writer as one
+        # numbered batch, and every compact_every_seconds the writer gets a
+        # full snapshot instead, which replaces state.pkl and empties the
+        # log. Batches numbered at or below the snapshot's are already in it
+        # and are skipped, both when writing and when replaying on load.
+        self._events: list[tuple] = []
+        self._save_q: queue.Queue[dict] = queue.Queue()
+        self._save_seq = 0
+        self._write_lock = Lock()
+        self._compacted_seq = 0
+        # unique_url_hashes only ever grows, so rather than re-pickling it in
+        # every snapshot, compaction appends the hashes added since the last
+        # one to url_path as raw little-endian uint64s. The snapshot records
+        # how many leading entries it covers (_urls_len); anything past that
+        # is from an interrupted compaction and is still in the log.
+        # _new_url_start counts the hashes recorded before _new_url_hashes[0],
+        # so a snapshot can say which ones it covers.
+        self._new_url_hashes = array("Q")
+        self._new_url_start = 0
+        self._urls_len = 0
+        self._urls_reset = False
+        Thread(target=self._save_worker, name="analytics-save", daemon=True).start()
 
         self._load_if_present()
         atexit.register(self.save)
@@ -257,8 +484,13 @@ class Analytics:
     def reset(self) -> None:
         with self._lock:
             self.unique_url_hashes.clear()
+            self._legacy_url_hashes = set()
+            self._new_url_hashes = array("Q")
+            self._new_url_start = 0
+            self._urls_reset = True
             self.subdomain_counts.clear()
             self.word_frequencies.clear()
+            self._wf_version += 1
             self.longest_page = LongestPage()
             self._exact_digests.clear()
             self._simhash_buckets.clear()
@@ -267,11 +499,27 @@ class Analytics:
             self.skipped_lowinfo = 0
             self._dirty_pages = 0
             self._last_save_at = time.monotonic()
+            # Logged events predate the reset; the next save must compact.
+            self._events.clear()
+            self._last_compact_at = float("-inf")
 
     def _load_if_present(self) -> None:
+        self._load_snapshot()
+        self._replay_log()
+
+    def _load_snapshot(self) -> None:
         try:
             with open(self.state_path, "rb") as f:
-                state = pickle.load(f)
+                if f.read(4) == _ZSTD_MAGIC:
+                    if zstandard is None:
+                        # Compressed by a run that had zstandard; can't read it.
+                        return
+                    f.seek(0)
+                    with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                        state = pickle.load(reader)
+                else:
+                    f.seek(0)
+                    state = pickle.load(f)
         except FileNotFoundError:
             return
         except Exception:
@@ -279,22 +527,128 @@ class Analytics:
             return
 
         try:
-            self.unique_url_hashes = state.get("unique_url_hashes", set())
+            if "url_hashes_len" in state:
+                self.unique_url_hashes = set(self._read_url_hashes(state["url_hashes_len"]))
+                self._legacy_url_hashes = set(state.get("legacy_url_hashes", ()))
+            else:
+                url_hashes = {
+                    # Older state files stored the full sha256 digest.
+                    int.from_bytes(h[:8], "little") if isinstance(h, bytes) else h
+                    for h in state.get("unique_url_hashes", ())
+                }
+                if state.get("url_key_hash", "sha256") == "blake2b_64":
+                    self.unique_url_hashes = url_hashes
+                    # Not in url_path yet; the next compaction writes them.
+                    self._new_url_hashes = array("Q", url_hashes)
+                    self._legacy_url_hashes = set(state.get("legacy_url_hashes", ()))
+                else:
+                    self._legacy_url_hashes = url_hashes
             self.subdomain_counts = state.get("subdomain_counts", Counter())
             self.word_frequencies = state.get("word_frequencies", Counter())
             self.longest_page = state.get("longest_page", LongestPage())
-            self._exact_digests = state.get("exact_digests", set())
-            self._simhash_buckets = state.get("simhash_buckets", {})
+            if state.get("exact_digest_hash", "sha256") == _PAGE_DIGEST_NAME:
+                self._exact_digests = state.get("exact_digests", set())
+            # Fingerprints made with another feature hash can't be compared
+            # with new ones; state files without the key used sha256.
+            if state.get("simhash_feature_hash", "sha256") == _FEATURE_HASH_NAME:
+                self._simhash_buckets = {
+                    # Older state files kept each bucket as a set.
+                    k: v if isinstance(v, array) else array("Q", sorted(v))
+                    for k, v in state.get("simhash_buckets", {}).items()
+                }
             self.duplicate_exact = int(state.get("duplicate_exact", 0))
             self.duplicate_near = int(state.get("duplicate_near", 0))
             self.skipped_lowinfo = int(state.get("skipped_lowinfo", 0))
+            self._compacted_seq = self._save_seq = int(state.get("log_seq", 0))
         except Exception:
             # If the pickle has unexpected shape, ignore.
             return
 
+    def _read_url_hashes(self, count: int) -> array:
+        hashes = array("Q")
+        try:
+            with open(self.url_path, "rb") as f:
+                hashes.fromfile(f, count)
+        except EOFError:
+            # Shorter than the snapshot says; keep what is there.
+            pass
+        except OSError:
+            pass
+        if sys.byteorder != "little":
+            hashes.byteswap()
+        self._urls_len = len(hashes)
+        return hashes
+
+    def _replay_log(self) -> None:
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        pos = 0
+        while pos < len(data):
+            end = pos + _LOG_LEN.size
+            if end > len(data):
+                break
+            (length,) = _LOG_LEN.unpack_from(data, pos)
+            if end + length > len(data):
+                break
+            try:
+                batch = pickle.loads(data[end : end + length])
+            except Exception:
+                break
+            pos = end + length
+            if batch["seq"] <= self._compacted_seq:
+                continue
+            same_digest = batch["page_digest"] == _PAGE_DIGEST_NAME
+            same_feature_hash = batch["feature_hash"] == _FEATURE_HASH_NAME
+            for event in batch["events"]:
+                self._apply_event(event, same_digest, same_feature_hash)
+            self._save_seq = max(self._save_seq, batch["seq"])
+
+        if pos < len(data):
+            # Torn tail from a crash mid-append; drop it so later appends
+            # start on a record boundary.
+            with open(self.log_path, "r+b") as f:
+                f.truncate(pos)
+
+    def _apply_event(self, event: tuple, same_digest: bool, same_feature_hash: bool) -> None:
+        kind = event[0]
+        if kind == "url":
+            _, url_hash, host = event
+            self.unique_url_hashes.add(url_hash)
+            self._new_url_hashes.append(url_hash)
+            if host:
+                self.subdomain_counts[host] += 1
+        elif kind == "words":
+            _, url_key, word_count, counts = event
+            if word_count > self.longest_page.words:
+                self.longest_page = LongestPage(url=url_key, words=word_count)
+            self.word_frequencies.update(counts)
+            self._wf_version += 1
+        elif kind == "page":
+            _, digest, sim = event
+            if same_digest:
+                self._exact_digests.add(digest)
+            if same_feature_hash:
+                self._add_simhash_locked(sim, _simhash_keys(sim))
+        elif kind == "dup_exact":
+            self.duplicate_exact += 1
+        elif kind == "dup_near":
+            self.duplicate_near += 1
+        elif kind == "lowinfo":
+            self.skipped_lowinfo += 1
+
     def tokenize(self, text: str) -> list[str]:
-        words = [w.lower().replace("’", "'") for w in _WORD_RE.findall(text)]
-        return [w for w in words if w not in self.stopwords]
+        stopwords = self.stopwords
+        if text.isascii():
+            # Lowercasing the whole page first is one C call instead of one
+            # per token; only safe for ASCII, where it can't create new letters.
+            return [w for w in _ASCII_WORD_RE.findall(text.lower()) if w not in stopwords]
+        # The regex accepts both apostrophes, so normalizing first keeps the
+        # same matches.
+        return [w for w in map(str.lower, _WORD_RE.findall(text.replace("’", "'"))) if w not in stopwords]
 
     def _load_stopwords_file(self) -> None:
         """
@@ -314,45 +668,50 @@ class Analytics:
 
         for path in candidates:
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-            except FileNotFoundError:
-                continue
+                key = (path, os.stat(path).st_mtime_ns)
             except OSError:
                 continue
 
-            extra: set[str] = set()
-            for line in lines:
-                line = line.strip()
-                if not line or line.startswith("#"):
+            extra = _STOPWORDS_CACHE.get(key)
+            if extra is None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        lines = f.readlines()
+                except OSError:
                     continue
-                extra.add(line.lower().replace("’", "'"))
 
-            if extra:
-                self.stopwords |= extra
-            return
+                words: set[str] = set()
+                for line in lines:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    words.add(line.lower().replace("’", "'"))
+                extra = _STOPWORDS_CACHE[key] = frozenset(words)
 
-    def _seen_key(self, url: str) -> bytes:
-        key = _defrag_url(url)
-        return sha256(key.encode("utf-8")).digest()
+            self.stopwords |= extra
+            return
 
     def record_url(self, url: str) -> bool:
         """Record a successfully fetched URL for uniqueness/subdomain counts."""
         if not url:
             return False
 
-        url_key = _defrag_url(url)
-        url_hash = self._seen_key(url_key)
+        url_key, host = _split_url(url)
+        url_hash = _url_key(url_key)
+        # Only resumed crawls with an older state file pay for the sha256.
+        legacy_hash = _legacy_url_key(url_key) if self._legacy_url_hashes else None
 
         with self._lock:
-            if url_hash in self.unique_url_hashes:
+            if url_hash in self.unique_url_hashes or legacy_hash in self._legacy_url_hashes:
                 return False
             self.unique_url_hashes.add(url_hash)
+            self._new_url_hashes.append(url_hash)
 
-            parsed = urlparse(url_key)
-            host = (parsed.hostname or "").lower()
             if host.endswith(".uci.edu"):
                 self.subdomain_counts[host] += 1
+            else:
+                host = None
+            self._events.append(("url", url_hash, host))
 
             self._dirty_pages += 1
             self._maybe_save_locked()
@@ -363,27 +722,36 @@ class Analytics:
         """Record tokenized (stopword-filtered) words for report stats."""
         if not url or not words:
             return
-        url_key = _defrag_url(url)
+        url_key, _host = _split_url(url)
+        word_count = len(words)
+        # Count outside the lock; merging a Counter only touches each unique
+        # word once, so the critical section is O(unique words), not O(words).
+        counts = Counter(words)
         with self._lock:
-            word_count = len(words)
             if word_count > self.longest_page.words:
                 self.longest_page = LongestPage(url=url_key, words=word_count)
-            self.word_frequencies.update(words)
+            self.word_frequencies.update(counts)
+            self._wf_version += 1
+            self._events.append(("words", url_key, word_count, counts))
             self._dirty_pages += 1
             self._maybe_save_locked()
 
     def unique_pages(self) -> int:
         with self._lock:
-            return len(self.unique_url_hashes)
+            return len(self.unique_url_hashes) + len(self._legacy_url_hashes)
 
     def top_words(self, n: int = 50) -> list[tuple[str, int]]:
         with self._lock:
-            items = ((w, c) for w, c in self.word_frequencies.items() if w not in self.stopwords)
-            return sorted(items, key=lambda wc: wc[1], reverse=True)[:n]
+            cached = self._top_words_cache
+            if cached is None or cached[0] != self._wf_version or cached[1] != n:
+                cached = (self._wf_version, n, _top_words(self.word_frequencies, self.stopwords, n))
+                self._top_words_cache = cached
+            return list(cached[2])
 
     def mark_lowinfo_skipped(self) -> None:
         with self._lock:
             self.skipped_lowinfo += 1
+            self._events.append(("lowinfo",))
             self._dirty_pages += 1
             self._maybe_save_locked()
 
@@ -393,9 +761,23 @@ class Analytics:
         # https://doi.org/10.1145/1327452.1327492 (Charikar, 2002)
         if not features:
             return 0
+        if np is not None:
+            hashes = np.fromiter(
+                (_feature_hash(f.encode("utf-8")) for f in features),
+                dtype="<u8",
+                count=len(features),
+            )
+            if _simhash_kernel is not None:
+                return int(_simhash_kernel(hashes))
+            # Viewed as little-endian bytes, a little-endian unpack puts bit i
+            # of each hash in column i, matching the pure-Python loop below.
+            rows = hashes.view(np.uint8).reshape(-1, 8)
+            bits = np.unpackbits(rows, axis=1, bitorder="little")
+            acc = 2 * bits.sum(axis=0, dtype=np.int32) - len(features)
+            return int.from_bytes(np.packbits(acc >= 0, bitorder="little").tobytes(), "little")
         acc = [0] * 64
         for f in features:
-            h = int.from_bytes(sha256(f.encode("utf-8")).digest()[:8], "big", signed=False)
+            h = _feature_hash(f.encode("utf-8"))
             for i in range(64):
                 acc[i] += 1 if (h >> i) & 1 else -1
         out = 0
@@ -419,84 +801,199 @@ class Analytics:
         if not words:
             return False
 
-        digest = sha256((" ".join(words)).encode("utf-8")).digest()
+        digest = _page_digest(" ".join(words).encode("utf-8"))
         shingles = self._shingles(words, k=3)
         sim = self._simhash(shingles)
-
-        def bucket_keys(simhash: int) -> list[int]:
-            # 4 bands of 16 bits each => key = (band_index << 16) | band_value
-            keys: list[int] = []
-            for i in range(4):
-                band = (simhash >> (i * 16)) & 0xFFFF
-                keys.append((i << 16) | band)
-            return keys
+        keys = _simhash_keys(sim)
 
         with self._lock:
             if digest in self._exact_digests:
                 self.duplicate_exact += 1
+                self._events.append(("dup_exact",))
                 return True
 
-            keys = bucket_keys(sim)
-            candidates: set[int] = set()
+            # Scan each matching table's bucket in place and stop at the
+            # first near match, rather than collecting the union first.
+            buckets = self._simhash_buckets
             for k in keys:
-                bucket = self._simhash_buckets.get(k)
-                if bucket:
-                    candidates.update(bucket)
-            for cand in candidates:
-                if (sim ^ cand).bit_count() <= near_threshold_bits:
+                bucket = buckets.get(k)
+                if bucket and _has_near_match(bucket, sim, near_threshold_bits):
                     self.duplicate_near += 1
+                    self._events.append(("dup_near",))
                     return True
 
             # Register as a new, non-duplicate page.
             self._exact_digests.add(digest)
-            for k in keys:
-                self._simhash_buckets.setdefault(k, set()).add(sim)
+            self._add_simhash_locked(sim, keys)
+            self._events.append(("page", digest, sim))
 
             self._dirty_pages += 1
             self._maybe_save_locked()
             return False
 
+    def _add_simhash_locked(self, sim: int, keys: list[int]) -> None:
+        buckets = self._simhash_buckets
+        for k in keys:
+            bucket = buckets.get(k)
+            if bucket is None:
+                buckets[k] = array("Q", (sim,))
+                continue
+            i = bisect.bisect_left(bucket, sim)
+            if i == len(bucket) or bucket[i] != sim:
+                bucket.insert(i, sim)
+
     def _maybe_save_locked(self) -> None:
         now = time.monotonic()
         if self._dirty_pages >= self.save_every_pages or (now - self._last_save_at) >= self.save_every_seconds:
-            self._save_locked()
+            if now - self._last_compact_at >= self.compact_every_seconds:
+                self._save_q.put(self._snapshot_locked())
+                self._last_compact_at = now
+            elif self._events:
+                self._save_q.put(self._batch_locked())
             self._dirty_pages = 0
             self._last_save_at = now
 
     def save(self) -> None:
+        """Compact the current state to disk now, on the calling thread."""
         with self._lock:
-            self._save_locked()
-
-    def _save_locked(self) -> None:
-        os.makedirs(self.out_dir, exist_ok=True)
-        tmp_path = f"{self.state_path}.tmp"
-        state = {
-            "unique_url_hashes": self.unique_url_hashes,
-            "subdomain_counts": self.subdomain_counts,
-            "word_frequencies": self.word_frequencies,
-            "longest_page": self.longest_page,
-            "exact_digests": self._exact_digests,
-            "simhash_buckets": self._simhash_buckets,
-            "duplicate_exact": self.duplicate_exact,
-            "duplicate_near": self.duplicate_near,
-            "skipped_lowinfo": self.skipped_lowinfo,
+            snapshot = self._snapshot_locked()
+            self._last_compact_at = time.monotonic()
+        self._write_snapshot(snapshot)
+
+    def _save_worker(self) -> None:
+        while True:
+            item = self._save_q.get()
+            try:
+                if "events" in item:
+                    self._append_batch(item)
+                else:
+                    self._write_snapshot(item)
+            except Exception:
+                # Best-effort like loading: a failed write must not kill the
+                # saver; the next compaction rewrites everything anyway.
+                pass
+
+    def _batch_locked(self) -> dict:
+        self._save_seq += 1
+        batch = {
+            "seq": self._save_seq,
+            "feature_hash": _FEATURE_HASH_NAME,
+            "page_digest": _PAGE_DIGEST_NAME,
+            "events": self._events,
         }
-        with open(tmp_path, "wb") as f:
-            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
-        os.replace(tmp_path, self.state_path)
-
-        summary_path = os.path.join(self.out_dir, "summary.json")
-        tmp_summary_path = f"{summary_path}.tmp"
-        summary = {
-            "unique_pages": len(self.unique_url_hashes),
-            "longest_page": {"url": self.longest_page.url, "words": self.longest_page.words},
-            "top_words": self.top_words(50),
-            "subdomains": dict(self.subdomain_counts),
-            "duplicates": {"exact": self.duplicate_exact, "near": self.duplicate_near, "lowinfo": self.skipped_lowinfo},
+        self._events = []
+        return batch
+
+    def _snapshot_locked(self) -> dict:
+        # Copy every container a worker may mutate, so the snapshot can be
+        # pickled off-lock. LongestPage is replaced, never mutated. Pending
+        # events are covered by the snapshot, so they are dropped.
+        self._save_seq += 1
+        self._events = []
+        return {
+            "seq": self._save_seq,
+            "url_hashes_end": self._new_url_start + len(self._new_url_hashes),
+            "state": {
+                # url_hashes_len is filled in once the hashes are on disk.
+                "url_key_hash": "blake2b_64",
+                # Only ever replaced after load, never mutated.
+                "legacy_url_hashes": self._legacy_url_hashes,
+                "subdomain_counts": self.subdomain_counts.copy(),
+                "word_frequencies": self.word_frequencies.copy(),
+                "longest_page": self.longest_page,
+                "exact_digests": self._exact_digests.copy(),
+                "exact_digest_hash": _PAGE_DIGEST_NAME,
+                "simhash_buckets": {k: array("Q", v) for k, v in self._simhash_buckets.items()},
+                "simhash_feature_hash": _FEATURE_HASH_NAME,
+                "duplicate_exact": self.duplicate_exact,
+                "duplicate_near": self.duplicate_near,
+                "skipped_lowinfo": self.skipped_lowinfo,
+                "log_seq": self._save_seq,
+            },
         }
-        with open(tmp_summary_path, "w", encoding="utf-8") as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_summary_path, summary_path)
+
+    def _append_batch(self, batch: dict) -> None:
+        with self._write_lock:
+            if batch["seq"] <= self._compacted_seq:
+                return
+            record = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(self.log_path, "ab", buffering=1 << 16) as f:
+                f.write(_LOG_LEN.pack(len(record)))
+                f.write(record)
+
+    def _append_url_hashes(self, offset: int, hashes: array) -> None:
+        """Write hashes to url_path after its first offset entries."""
+        if sys.byteorder != "little":
+            hashes = array("Q", hashes)
+            hashes.byteswap()
+        fd = os.open(self.url_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with open(fd, "r+b") as f:
+            f.seek(offset * hashes.itemsize)
+            hashes.tofile(f)
+            f.truncate()
+
+    def _write_snapshot(self, snapshot: dict) -> None:
+        with self._write_lock:
+            if snapshot["seq"] <= self._compacted_seq:
+                return
+            state = snapshot["state"]
+            # Taken now rather than with the snapshot so a snapshot skipped
+            # above leaves its hashes to the next one.
+            with self._lock:
+                count = max(0, snapshot["url_hashes_end"] - self._new_url_start)
+                new_url_hashes = self._new_url_hashes[:count]
+                del self._new_url_hashes[:count]
+                self._new_url_start += count
+                urls_reset, self._urls_reset = self._urls_reset, False
+            try:
+                os.makedirs(self.out_dir, exist_ok=True)
+                urls_len = 0 if urls_reset else self._urls_len
+                self._append_url_hashes(urls_len, new_url_hashes)
+                state["url_hashes_len"] = urls_len + len(new_url_hashes)
+                tmp_path = f"{self.state_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    if zstandard is not None:
+                        with zstandard.ZstdCompressor(level=3).stream_writer(f, closefd=False) as writer:
+                            pickle.dump(state, writer, protocol=pickle.HIGHEST_PROTOCOL)
+                    else:
+                        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.state_path)
+            except BaseException:
+                # Unlike the rest of the state, these hashes are not in the
+                # next snapshot unless they are handed back.
+                with self._lock:
+                    self._new_url_hashes[:0] = new_url_hashes
+                    self._new_url_start -= len(new_url_hashes)
+                    self._urls_reset = self._urls_reset or urls_reset
+                raise
+            self._urls_len = state["url_hashes_len"]
+            # Every logged batch is numbered at or below this snapshot.
+            with open(self.log_path, "wb"):
+                pass
+            self._compacted_seq = snapshot["seq"]
+
+            summary_path = os.path.join(self.out_dir, "summary.json")
+            tmp_summary_path = f"{summary_path}.tmp"
+            longest_page = state["longest_page"]
+            summary = {
+                "unique_pages": state["url_hashes_len"] + len(state["legacy_url_hashes"]),
+                "longest_page": {"url": longest_page.url, "words": longest_page.words},
+                "top_words": _top_words(state["word_frequencies"], self.stopwords, 50),
+                "subdomains": dict(state["subdomain_counts"]),
+                "duplicates": {
+                    "exact": state["duplicate_exact"],
+                    "near": state["duplicate_near"],
+                    "lowinfo": state["skipped_lowinfo"],
+                },
+            }
+            if orjson is not None:
+                with open(tmp_summary_path, "wb") as f:
+                    f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+            else:
+                with open(tmp_summary_path, "w", encoding="utf-8") as f:
+                    json.dump(summary, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_summary_path, summary_path)
 
 
 analytics = Analytics()
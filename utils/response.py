@@ -26,26 +26,35 @@ def _maybe_add_base_site_packages() -> bool:
             added = True
     return added
 
+def _unpickle_raw_response(raw_pickled):
+    try:
+        return pickle.loads(raw_pickled)
+    except ModuleNotFoundError:
+        # Likely missing `requests` (or a dependency) inside the venv.
+        if _maybe_add_base_site_packages():
+            try:
+                return pickle.loads(raw_pickled)
+            except Exception:
+                return None
+        return None
+    except Exception:
+        return None
+
 class Response(object):
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        self.raw_response = None
-        raw_pickled = resp_dict.get("response")
-        if not raw_pickled:
-            return
-        try:
-            self.raw_response = pickle.loads(raw_pickled)
-        except ModuleNotFoundError:
-            # Likely missing `requests` (or a dependency) inside the venv.
-            if _maybe_add_base_site_packages():
-                try:
-                    self.raw_response = pickle.loads(raw_pickled)
-                    return
-                except Exception:
-                    self.raw_response = None
-            else:
-                self.raw_response = None
-        except Exception:
-            self.raw_response = None
+        # Unpickled on first access: callers that only check status/error
+        # (every non-200 response) never pay for it.
+        self._raw_pickled = resp_dict.get("response")
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        raw_pickled = self._raw_pickled
+        if raw_pickled:
+            # Drop the pickled bytes once decoded.
+            self._raw_pickled = None
+            self._raw_response = _unpickle_raw_response(raw_pickled)
+        return self._raw_response